@@ -1,11 +1,176 @@
 import os
-import json
+import time
+import atexit
+import logging
+import threading
+import random
+import asyncio
+import re
+import io
+import hashlib
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import List, Literal, Optional
 import google.generativeai as genai
+import orjson
 from dotenv import load_dotenv
+from pydantic import BaseModel, Field, TypeAdapter
+from pydantic_core import from_json
+from rate_limiter import RateLimiter, DynamicSemaphore
+from semantic_cache import SemanticCache, EMBEDDING_MODEL
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Tokens reserved for the model's JSON reply when budgeting against TPM
+OUTPUT_TOKEN_BUDGET = 256
+
+class Classification(BaseModel):
+    """Structured classification returned by Gemini (enforced via response_schema)"""
+    category: Literal['BILLING', 'TECHNICAL', 'ACCOUNT', 'FEATURE_REQUEST', 'CHURN']
+    priority: Literal['LOW', 'MEDIUM', 'HIGH', 'URGENT']
+    should_escalate: bool
+    escalate_to: Optional[Literal['SUPPORT_TEAM', 'ACCOUNT_MANAGER', 'ENGINEERING', 'BILLING']]
+    reasoning: str = Field(description="Brief explanation of classification decision")
+    suggested_tags: List[str]
+    confidence: float = Field(description="Confidence from 0.0 to 1.0")
+
+
+# Structured-output configs for single-ticket and multi-ticket calls
+CLASSIFICATION_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=Classification
+)
+BATCH_CLASSIFICATION_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=list[Classification]
+)
+_BATCH_ADAPTER = TypeAdapter(list[Classification])
+
+# Ticket fields rendered into prompts; %-style so a ticket dict formats in one C-level call
+TICKET_TEMPLATE = (
+    "Ticket ID: %(id)s\n"
+    "Subject: %(subject)s\n"
+    "Description: %(description)s\n"
+    "Customer Email: %(customer_email)s\n"
+    "Customer Tier: %(customer_tier)s\n"
+    "Created: %(created_at)s"
+)
+PROMPT_TEMPLATE = TICKET_TEMPLATE + "\n\nProvide classification in JSON format."
+
+# Tickets per multi-ticket prompt (larger batches degrade classification quality)
+BATCH_SIZE = 5
+
+# Gemini Batch API (offline, ~50% cheaper, no RPM limits, results within 24h)
+BATCH_API_MODEL = 'gemini-2.0-flash'
+BATCH_API_MIN_TICKETS = 50      # below this the wait isn't worth it; use the live pipeline
+BATCH_POLL_BASE = 10.0
+BATCH_POLL_CAP = 300.0
+BATCH_TERMINAL_STATES = (
+    'JOB_STATE_SUCCEEDED', 'JOB_STATE_PARTIALLY_SUCCEEDED',
+    'JOB_STATE_FAILED', 'JOB_STATE_CANCELLED', 'JOB_STATE_EXPIRED'
+)
+# Terminal states that still produce a results file (failed lines carry their own error)
+BATCH_RESULT_STATES = ('JOB_STATE_SUCCEEDED', 'JOB_STATE_PARTIALLY_SUCCEEDED')
+
+# Error markers that mean the provider is throttling or overloaded
+THROTTLE_MARKERS = ('429', 'RESOURCE_EXHAUSTED', '503', 'UNAVAILABLE')
+
+# Error markers for transient failures worth retrying
+RETRY_MARKERS = THROTTLE_MARKERS + ('500', 'INTERNAL', 'DEADLINE_EXCEEDED')
+
+# Retry policy for transient Gemini errors
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+
+# Server-provided retry hint, e.g. "retry_delay { seconds: 7 }" or "Please retry in 7.2s"
+RETRY_HINT = re.compile(r'retry_delay\s*\{\s*seconds:\s*(\d+)|retry in ([\d.]+)s', re.IGNORECASE)
+
+
+def _cache_key(ticket):
+    """Content hash of the fields that determine a ticket's classification"""
+    payload = orjson.dumps({
+        's': ticket['subject'],
+        'd': ticket['description'],
+        't': ticket['customer_tier'],
+    }, option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(payload).hexdigest()
+
+
+# Outermost JSON object/array, for replies with stray text around the payload
+JSON_PAYLOAD = re.compile(r'[\[{].*[\]}]', re.DOTALL)
+
+
+def _load_json(text):
+    """
+    Tolerantly parse a JSON reply in a single pass.
+    
+    Recovers truncated trailing strings and, failing that, retries on the
+    outermost object/array to skip surrounding junk.
+    
+    Raises:
+        ValueError: If no JSON payload can be recovered
+    """
+    try:
+        return from_json(text, allow_partial='trailing-strings')
+    except ValueError:
+        match = JSON_PAYLOAD.search(text)
+        if not match:
+            raise
+        return from_json(match.group(0), allow_partial='trailing-strings')
+
+
+def _load_partial(text):
+    """Best-effort snapshot of a still-streaming JSON object (None if nothing parseable yet)"""
+    try:
+        partial = from_json(text, allow_partial=True)
+    except ValueError:
+        return None
+    return partial if isinstance(partial, dict) else None
+
+
+def _embedding_text(ticket):
+    """Text embedded for semantic cache lookups"""
+    return f"{ticket['subject']}\n{ticket['description']}"
+
+
+async def _iterate(items):
+    """Iterate a sync or async iterable uniformly"""
+    if hasattr(items, '__aiter__'):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+def _is_throttle(error):
+    """Check whether an API error is a rate-limit / overload response"""
+    message = str(error)
+    return any(marker in message for marker in THROTTLE_MARKERS)
+
+
+def _should_retry(error):
+    """Check whether an API error is transient and worth retrying"""
+    message = str(error)
+    return any(marker in message for marker in RETRY_MARKERS)
+
+
+def _backoff_delay(attempt, error):
+    """
+    Seconds to wait before the next attempt.
+    
+    Honors a server retry hint when the error carries one, otherwise uses
+    capped exponential backoff with jitter.
+    """
+    match = RETRY_HINT.search(str(error))
+    if match:
+        return min(BACKOFF_CAP, float(match.group(1) or match.group(2)))
+    return min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt + random.random())
+
 
 class AgentClassifier:
     """
@@ -13,63 +178,261 @@ class AgentClassifier:
     Uses Google Gemini API with optimized prompt from Phase 2 research.
     """
     
+    # Process-wide instance returned by get(), and the key genai was configured with
+    _instance = None
+    _instance_lock = threading.Lock()
+    _configured_key = None
+    _configure_lock = threading.Lock()
+    
     def __init__(self):
         """Initialize the classifier with Gemini API"""
         api_key = os.getenv('GEMINI_API_KEY')
         if not api_key:
             raise ValueError("GEMINI_API_KEY not found in .env file")
         
-        genai.configure(api_key=api_key)
+        # genai.configure is global state; only redo it if the key changed
+        with AgentClassifier._configure_lock:
+            if AgentClassifier._configured_key != api_key:
+                genai.configure(api_key=api_key)
+                AgentClassifier._configured_key = api_key
+        
         self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        
+        # The system prompt is constant, so build it (and the prompt header) once
+        self._system_prompt = self._build_system_prompt()
+        self._prompt_header = self._system_prompt + "\n\nNow classify this customer support ticket:\n\n"
+        # Whole single-ticket prompt specialized into one bound formatter: ticket dict -> prompt
+        self._format_prompt = (self._prompt_header.replace('%', '%%') + PROMPT_TEMPLATE).__mod__
+        
+        # Shared RPM/TPM limiter and AIMD concurrency controller for all async calls
+        self.limiter = RateLimiter.from_env()
+        self.concurrency = DynamicSemaphore.from_profile()
+        self._system_prompt_tokens = None
+        self._system_prompt_tokens_lock = asyncio.Lock()
+        
+        # Optional exact-match response cache (enable with CLASSIFIER_CACHE=1)
+        self._cache = {} if os.getenv('CLASSIFIER_CACHE') == '1' else None
+        
+        # Optional embedding-similarity cache for paraphrased tickets (SEMANTIC_CACHE=1)
+        self._semantic_cache = SemanticCache.from_env() if os.getenv('SEMANTIC_CACHE') == '1' else None
+        
+        # Client for the Gemini Batch API, created on first use
+        self._api_key = api_key
+        self._batch_client = None
+    
+    @classmethod
+    def get(cls):
+        """
+        Return the process-wide classifier, creating it on first use.
+        
+        Safe to call from multiple threads; only one instance is ever built.
+        """
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
     
     def _build_system_prompt(self):
         """
         Build the optimized system prompt from Phase 2 research.
-        This prompt achieved 75% improvement over baseline.
-        """
-        return """You are a customer support ticket classification agent for FlowTask, a project management SaaS platform.
-
-CLASSIFICATION RULES (Based on Phase 2 Optimization):
-
-1. CUSTOMER TIER TRIGGERS:
-   - Enterprise customers: ALWAYS escalate (regardless of issue)
-   - Pro customers: Evaluate based on other criteria
-
-2. SECURITY TRIGGERS (ALWAYS escalate):
-   - Login/password issues with urgency
-   - Account access problems
-   - Any credential-related requests
-
-3. RISK TRIGGERS (ALWAYS escalate):
-   - Churn threats: mentions of "cancel", "switching", "competitor"
-   - Legal language: "lawyer", "lawsuit", "legal action"
-   - Angry/hostile sentiment
-   - Financial disputes or refund requests
-
-4. TECHNICAL TRIGGERS (ALWAYS escalate):
-   - Bugs affecting operations for >24 hours
-   - Data loss or export failures
-   - Performance degradation
-
-5. CAN RESOLVE AUTONOMOUSLY:
-   - Simple billing inquiries (invoice requests)
-   - Feature requests (log and acknowledge, don't escalate)
-   - How-to questions with clear answers
-   - Known system behaviors
-
-OUTPUT FORMAT:
-Respond with ONLY valid JSON in this exact format:
-{
-  "category": "BILLING|TECHNICAL|ACCOUNT|FEATURE_REQUEST|CHURN",
-  "priority": "LOW|MEDIUM|HIGH|URGENT",
-  "should_escalate": true or false,
-  "escalate_to": "SUPPORT_TEAM|ACCOUNT_MANAGER|ENGINEERING|BILLING" or null,
-  "reasoning": "Brief explanation of classification decision",
-  "suggested_tags": ["tag1", "tag2", "tag3"],
-  "confidence": 0.0 to 1.0
-}
-
-CRITICAL: Output ONLY the JSON object. No markdown formatting, no other text before or after."""
+        
+        Compact form of the Phase 2 rules; the output format is enforced by
+        the response schema, so it is not spelled out here.
+        """
+        return """You classify customer support tickets for FlowTask, a project management SaaS platform.
+
+ESCALATE if ANY applies:
+- Tier: Enterprise → ALWAYS escalate (overrides everything below); Pro → judge by the rules
+- Security: urgent login/password issue; account access problem; credential request
+- Risk: churn ("cancel", "switching", "competitor"); legal ("lawyer", "lawsuit", "legal action"); angry/hostile tone; financial dispute or refund request
+- Technical: bug blocking operations >24h; data loss or export failure; performance degradation
+
+RESOLVE AUTONOMOUSLY (escalate_to=null):
+- Simple billing inquiry (e.g. invoice request)
+- Feature request (log and acknowledge, don't escalate)
+- How-to question with a clear answer; known system behavior"""
+
+    def _format_ticket(self, ticket):
+        """Render a ticket's fields for inclusion in a prompt"""
+        return TICKET_TEMPLATE % ticket
+
+    def _build_prompt(self, ticket):
+        """Build the complete prompt for a single ticket"""
+        return self._format_prompt(ticket)
+
+    def _build_batch_prompt(self, tickets):
+        """
+        Build one prompt that classifies several tickets.
+        
+        The system prompt is sent once and the model is asked for a JSON array
+        with one classification object per ticket, in the same order.
+        """
+        blocks = [
+            f"[TICKET {i}]\n{self._format_ticket(ticket)}"
+            for i, ticket in enumerate(tickets, 1)
+        ]
+        return (
+            self._system_prompt
+            + f"\n\nClassify each of the following {len(tickets)} customer support tickets. "
+            + "Respond with a JSON array containing one classification per ticket, "
+            + "in the same order:\n\n"
+            + "\n\n".join(blocks)
+        )
+
+    async def _estimate_tokens(self, prompt):
+        """
+        Estimate the TPM cost of a prompt plus the reply budget.
+        
+        The system prompt is counted once with the Gemini tokenizer and cached;
+        the short per-ticket remainder is approximated at ~4 chars per token.
+        """
+        if self._system_prompt_tokens is None:
+            # Concurrent first calls wait for a single count_tokens request
+            async with self._system_prompt_tokens_lock:
+                if self._system_prompt_tokens is None:
+                    try:
+                        counted = await self.model.count_tokens_async(self._system_prompt)
+                        self._system_prompt_tokens = counted.total_tokens
+                    except Exception:
+                        self._system_prompt_tokens = len(self._system_prompt) // 4
+        
+        remainder = max(0, len(prompt) - len(self._system_prompt))
+        return self._system_prompt_tokens + remainder // 4 + OUTPUT_TOKEN_BUDGET
+
+    def _parse_response(self, ticket, response_text):
+        """
+        Parse raw model output into a classification result.
+        
+        Args:
+            ticket (dict): The ticket that was classified
+            response_text (str): Raw text returned by Gemini
+            
+        Returns:
+            dict: Classification result with success status
+        """
+        try:
+            classification = Classification.model_validate(_load_json(response_text)).model_dump()
+        except ValueError as e:
+            return {
+                "success": False,
+                "ticket_id": ticket['id'],
+                "error": f"Failed to parse JSON response: {str(e)}",
+                "raw_response": response_text
+            }
+        
+        return {
+            "success": True,
+            "ticket_id": ticket['id'],
+            "classification": classification
+        }
+
+    def _parse_batch_response(self, response_text, count):
+        """
+        Parse a multi-ticket reply into a list of classifications.
+        
+        Raises:
+            ValueError: If the reply is not an array of `count` valid classifications
+        """
+        classifications = _BATCH_ADAPTER.validate_python(_load_json(response_text))
+        if len(classifications) != count:
+            raise ValueError(f"Expected {count} classifications, got {len(classifications)}")
+        return [c.model_dump() for c in classifications]
+
+    def _embed(self, ticket):
+        """Embed a ticket for the semantic cache (None when disabled or on failure)"""
+        if self._semantic_cache is None:
+            return None
+        
+        try:
+            return genai.embed_content(model=EMBEDDING_MODEL, content=_embedding_text(ticket))['embedding']
+        except Exception:
+            return None
+
+    async def _embed_async(self, tickets):
+        """
+        Embed several tickets in a single request for the semantic cache.
+        
+        Returns:
+            list: One embedding per ticket (None entries when disabled or on failure)
+        """
+        if self._semantic_cache is None:
+            return [None] * len(tickets)
+        
+        try:
+            result = await genai.embed_content_async(
+                model=EMBEDDING_MODEL,
+                content=[_embedding_text(t) for t in tickets]
+            )
+            return result['embedding']
+        except Exception:
+            return [None] * len(tickets)
+
+    async def _embed_misses_async(self, tickets):
+        """Embed only the tickets the exact-match cache can't answer (None for the rest)"""
+        misses = []
+        for i, ticket in enumerate(tickets):
+            try:
+                if self._exact_lookup(ticket) is None:
+                    misses.append(i)
+            except Exception:
+                misses.append(i)
+        
+        embeddings = [None] * len(tickets)
+        if misses:
+            fetched = await self._embed_async([tickets[i] for i in misses])
+            for i, embedding in zip(misses, fetched):
+                embeddings[i] = embedding
+        return embeddings
+
+    @staticmethod
+    def _cache_hit(ticket, classification):
+        """Wrap a cached classification in the classify_ticket result shape"""
+        if classification is None:
+            return None
+        
+        return {
+            "success": True,
+            "ticket_id": ticket['id'],
+            "classification": dict(classification)
+        }
+
+    def _exact_lookup(self, ticket):
+        """Return a cached result for an identical ticket, or None"""
+        if self._cache is None:
+            return None
+        return self._cache_hit(ticket, self._cache.get(_cache_key(ticket)))
+
+    def _semantic_lookup(self, ticket, embedding):
+        """Return a cached result for a near-duplicate ticket, or None"""
+        if embedding is None:
+            return None
+        return self._cache_hit(ticket, self._semantic_cache.lookup(embedding, ticket['customer_tier']))
+
+    def _cache_store(self, ticket, result, embedding=None):
+        """Remember a successful classification for identical and similar tickets"""
+        if not result['success']:
+            return
+        
+        if self._cache is not None:
+            self._cache[_cache_key(ticket)] = dict(result['classification'])
+        
+        if embedding is not None:
+            self._semantic_cache.add(embedding, ticket['customer_tier'], result['classification'])
+
+    def save_caches(self):
+        """Persist the semantic cache to disk (no-op when disabled or unchanged)"""
+        if self._semantic_cache is not None:
+            self._semantic_cache.save()
+
+    def _api_error(self, ticket, error):
+        """Build the failure result for an API-level error"""
+        # Malformed input (e.g. a null entry in a streamed file) still gets a result
+        return {
+            "success": False,
+            "ticket_id": ticket.get('id') if isinstance(ticket, dict) else None,
+            "error": f"API error: {str(error)}"
+        }
 
     def classify_ticket(self, ticket):
         """
@@ -81,58 +444,246 @@ CRITICAL: Output ONLY the JSON object. No markdown formatting, no other text bef
         Returns:
             dict: Classification result with success status
         """
-        # Build the complete prompt
-        full_prompt = f"""{self._build_system_prompt()}
-
-Now classify this customer support ticket:
+        try:
+            cached = self._exact_lookup(ticket)
+            if cached:
+                return cached
+            embedding = self._embed(ticket)
+            cached = self._semantic_lookup(ticket, embedding)
+            if cached:
+                return cached
+            full_prompt = self._build_prompt(ticket)
+        except Exception as e:
+            return self._api_error(ticket, e)
+        
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                response_text = self.model.generate_content(
+                    full_prompt,
+                    generation_config=CLASSIFICATION_CONFIG
+                ).text
+                break
+            except Exception as e:
+                if attempt == MAX_ATTEMPTS - 1 or not _should_retry(e):
+                    return self._api_error(ticket, e)
+                time.sleep(_backoff_delay(attempt, e))
+        
+        result = self._parse_response(ticket, response_text)
+        self._cache_store(ticket, result, embedding)
+        return result
 
-Ticket ID: {ticket['id']}
-Subject: {ticket['subject']}
-Description: {ticket['description']}
-Customer Email: {ticket['customer_email']}
-Customer Tier: {ticket['customer_tier']}
-Created: {ticket['created_at']}
+    async def _generate_async(self, prompt, tokens, generation_config=CLASSIFICATION_CONFIG):
+        """
+        Call Gemini with rate limiting, AIMD feedback and retries.
+        
+        Args:
+            prompt (str): Complete prompt to send
+            tokens (int): Estimated TPM cost of the call
+            generation_config (GenerationConfig): Structured-output config for the call
+            
+        Returns:
+            str: Raw response text
+            
+        Raises:
+            Exception: The last API error once retries are exhausted
+        """
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                await self.limiter.acquire(tokens)
+                response = await self.model.generate_content_async(
+                    prompt,
+                    generation_config=generation_config
+                )
+                response_text = response.text
+            except Exception as e:
+                if _is_throttle(e):
+                    self.concurrency.on_throttle()
+                if attempt == MAX_ATTEMPTS - 1 or not _should_retry(e):
+                    raise
+                await asyncio.sleep(_backoff_delay(attempt, e))
+            else:
+                self.concurrency.on_success()
+                return response_text
 
-Provide classification in JSON format."""
+    async def classify_ticket_async(self, ticket, embedding=None):
+        """
+        Classify a single ticket using the async Gemini client.
+        
+        Args:
+            ticket (dict): Ticket data with id, subject, description, etc.
+            embedding (list): Precomputed semantic-cache embedding, if any
+            
+        Returns:
+            dict: Classification result with success status
+        """
+        try:
+            cached = self._exact_lookup(ticket)
+            if cached:
+                return cached
+            if embedding is None:
+                embedding = (await self._embed_async([ticket]))[0]
+            cached = self._semantic_lookup(ticket, embedding)
+            if cached:
+                return cached
+            full_prompt = self._build_prompt(ticket)
+            tokens = await self._estimate_tokens(full_prompt)
+            response_text = await self._generate_async(full_prompt, tokens)
+        except Exception as e:
+            return self._api_error(ticket, e)
+        
+        result = self._parse_response(ticket, response_text)
+        self._cache_store(ticket, result, embedding)
+        return result
 
+    async def stream_classify_ticket_async(self, ticket):
+        """
+        Classify a single ticket, yielding partial output as Gemini streams it.
+        
+        Args:
+            ticket (dict): Ticket data with id, subject, description, etc.
+            
+        Yields:
+            dict: {"partial": {...}} snapshots of the classification parsed so far,
+                then the final classification result (same shape as classify_ticket)
+        """
         try:
-            # Call Gemini API
-            response = self.model.generate_content(full_prompt)
-            response_text = response.text.strip()
+            cached = self._exact_lookup(ticket)
+            if cached:
+                yield cached
+                return
+            embedding = (await self._embed_async([ticket]))[0]
+            cached = self._semantic_lookup(ticket, embedding)
+            if cached:
+                yield cached
+                return
             
-            # Remove markdown code blocks if present
-            if '```json' in response_text:
-                response_text = response_text.split('```json')[1].split('```')[0].strip()
-            elif '```' in response_text:
-                response_text = response_text.split('```')[1].split('```')[0].strip()
+            full_prompt = self._build_prompt(ticket)
+            await self.limiter.acquire(await self._estimate_tokens(full_prompt))
+            stream = await self.model.generate_content_async(
+                full_prompt,
+                generation_config=CLASSIFICATION_CONFIG,
+                stream=True
+            )
             
-            # Parse JSON
-            classification = json.loads(response_text)
+            response_text = ""
+            last = None
+            async for chunk in stream:
+                response_text += chunk.text
+                partial = _load_partial(response_text)
+                if partial and partial != last:
+                    last = partial
+                    yield {"partial": partial}
+        except Exception as e:
+            if _is_throttle(e):
+                self.concurrency.on_throttle()
+            yield self._api_error(ticket, e)
+            return
+        
+        self.concurrency.on_success()
+        result = self._parse_response(ticket, response_text)
+        self._cache_store(ticket, result, embedding)
+        yield result
+
+    async def _bounded(self, ticket, embedding=None):
+        """Classify a ticket while holding a slot in the AIMD concurrency controller"""
+        async with self.concurrency:
+            return await self.classify_ticket_async(ticket, embedding)
+
+    async def process_batch_async(self, tickets, on_progress=None, on_total=None):
+        """
+        Process multiple tickets concurrently.
+        
+        Tickets are pulled from `tickets` into a bounded queue as workers free
+        up, so a lazy source (e.g. ijson streaming a file) never has to be
+        fully materialized. In-flight requests are bounded by the AIMD
+        controller, which starts at self.concurrency.max_limit (the provider
+        profile's max_concurrency) and backs off whenever Gemini throttles.
+        
+        Args:
+            tickets (iterable): Ticket dictionaries (list, generator or async iterator)
+            on_progress (callable): Optional on_progress(done, result), called after each ticket
+            on_total (callable): Optional on_total(total), called once the ticket count is known
+                (up front for a list, once the source is exhausted for a stream)
             
-            # Return success result
-            return {
-                "success": True,
-                "ticket_id": ticket['id'],
-                "classification": classification
-            }
+        Returns:
+            list: List of classification results, in input order
+        """
+        workers = self.concurrency.max_limit
+        queue = asyncio.Queue(maxsize=workers * 2)
+        results = {}
+        
+        logger.info("Processing tickets with Gemini (concurrency=%d)", self.concurrency.current_limit)
+        
+        async def enqueue(pending, start):
+            # One batched embedding request per group, skipping exact-cache hits
+            embeddings = await self._embed_misses_async(pending)
+            for offset, (ticket, embedding) in enumerate(zip(pending, embeddings)):
+                await queue.put((start + offset, ticket, embedding))
+        
+        async def produce():
+            sized = hasattr(tickets, '__len__')
+            if on_total and sized:
+                on_total(len(tickets))
             
-        except json.JSONDecodeError as e:
-            return {
-                "success": False,
-                "ticket_id": ticket['id'],
-                "error": f"Failed to parse JSON response: {str(e)}",
-                "raw_response": response_text if 'response_text' in locals() else None
-            }
-        except Exception as e:
-            return {
-                "success": False,
-                "ticket_id": ticket['id'],
-                "error": f"API error: {str(e)}"
-            }
-    
+            pending = []
+            count = 0
+            async for ticket in _iterate(tickets):
+                pending.append(ticket)
+                if len(pending) == workers:
+                    await enqueue(pending, count)
+                    count += len(pending)
+                    pending = []
+            if pending:
+                await enqueue(pending, count)
+                count += len(pending)
+            
+            if on_total and not sized:
+                on_total(count)
+            
+            for _ in range(workers):
+                await queue.put(None)
+        
+        async def consume():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                
+                i, ticket, embedding = item
+                try:
+                    result = await self._bounded(ticket, embedding)
+                except Exception as e:
+                    result = self._api_error(ticket, e)
+                results[i] = result
+                
+                if result['success']:
+                    logger.info("[%d] %s ✓ SUCCESS", len(results), result['ticket_id'])
+                else:
+                    logger.warning("[%d] %s ✗ FAILED: %s", len(results), result['ticket_id'], result['error'])
+                
+                if on_progress:
+                    on_progress(len(results), result)
+        
+        # Run producer and workers together so a failure on either side (or a
+        # cancellation) tears the whole pipeline down instead of blocking on the queue
+        tasks = [asyncio.create_task(produce())]
+        tasks += [asyncio.create_task(consume()) for _ in range(workers)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        # Log summary
+        successful = sum(1 for r in results.values() if r['success'])
+        logger.info("Summary: %d/%d tickets classified successfully", successful, len(results))
+        
+        self.save_caches()
+        return [results[i] for i in range(len(results))]
+
     def process_batch(self, tickets):
         """
-        Process multiple tickets.
+        Process multiple tickets (sync wrapper around process_batch_async).
         
         Args:
             tickets (list): List of ticket dictionaries
@@ -140,32 +691,236 @@ Provide classification in JSON format."""
         Returns:
             list: List of classification results
         """
-        results = []
-        total = len(tickets)
+        return asyncio.run(self.process_batch_async(tickets))
+
+    async def _classify_chunk_async(self, chunk, embeddings):
+        """
+        Classify up to BATCH_SIZE tickets with a single Gemini call.
         
-        print(f"\n{'='*80}")
-        print(f"PROCESSING {total} TICKETS WITH GEMINI")
-        print(f"{'='*80}\n")
+        Tickets the batched reply doesn't cover (API error, malformed array,
+        non-object entry) are retried individually.
+        """
+        try:
+            prompt = self._build_batch_prompt(chunk)
+            tokens = await self._estimate_tokens(prompt) + OUTPUT_TOKEN_BUDGET * (len(chunk) - 1)
+            response_text = await self._generate_async(prompt, tokens, BATCH_CLASSIFICATION_CONFIG)
+            classifications = self._parse_batch_response(response_text, len(chunk))
+        except Exception as e:
+            logger.warning("Batched classification of %d tickets failed, retrying individually: %s", len(chunk), e)
+            classifications = [None] * len(chunk)
         
-        for i, ticket in enumerate(tickets, 1):
-            print(f"[{i}/{total}] Processing {ticket['id']}... ", end='', flush=True)
-            result = self.classify_ticket(ticket)
-            
-            if result['success']:
-                print("✓ SUCCESS")
+        results = []
+        for ticket, embedding, classification in zip(chunk, embeddings, classifications):
+            if isinstance(classification, dict):
+                result = {
+                    "success": True,
+                    "ticket_id": ticket['id'],
+                    "classification": classification
+                }
+                self._cache_store(ticket, result, embedding)
             else:
-                print(f"✗ FAILED: {result['error']}")
-            
+                result = await self.classify_ticket_async(ticket, embedding)
             results.append(result)
         
-        # Print summary
-        successful = sum(1 for r in results if r['success'])
-        print(f"\n{'='*80}")
-        print(f"SUMMARY: {successful}/{total} tickets classified successfully")
-        print(f"{'='*80}\n")
+        return results
+
+    async def _bounded_chunk(self, chunk, embeddings):
+        """Classify a chunk while holding a slot in the AIMD concurrency controller"""
+        async with self.concurrency:
+            return await self._classify_chunk_async(chunk, embeddings)
+
+    async def classify_tickets_batched_async(self, tickets, batch_size=BATCH_SIZE):
+        """
+        Classify tickets several-per-prompt to amortize the system prompt.
+        
+        Sends the system prompt once per `batch_size` tickets instead of once
+        per ticket, cutting input tokens and RPM usage roughly `batch_size`-fold.
+        
+        Args:
+            tickets (list): List of ticket dictionaries
+            batch_size (int): Tickets per Gemini call
+            
+        Returns:
+            list: List of classification results, in input order
+        """
+        embeddings = await self._embed_misses_async(tickets)
+        results = [None] * len(tickets)
+        pending = []
         
+        for i, (ticket, embedding) in enumerate(zip(tickets, embeddings)):
+            try:
+                results[i] = self._exact_lookup(ticket) or self._semantic_lookup(ticket, embedding)
+            except Exception as e:
+                results[i] = self._api_error(ticket, e)
+            if results[i] is None:
+                pending.append(i)
+        
+        chunks = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        outcomes = await asyncio.gather(*[
+            self._bounded_chunk([tickets[i] for i in chunk], [embeddings[i] for i in chunk])
+            for chunk in chunks
+        ])
+        
+        for chunk, chunk_results in zip(chunks, outcomes):
+            for i, result in zip(chunk, chunk_results):
+                results[i] = result
+        
+        self.save_caches()
         return results
 
+    def classify_tickets_batched(self, tickets, batch_size=BATCH_SIZE):
+        """
+        Classify tickets several-per-prompt (sync wrapper around classify_tickets_batched_async).
+        
+        Args:
+            tickets (list): List of ticket dictionaries
+            batch_size (int): Tickets per Gemini call
+            
+        Returns:
+            list: List of classification results, in input order
+        """
+        return asyncio.run(self.classify_tickets_batched_async(tickets, batch_size))
+
+    def _get_batch_client(self):
+        """Lazily create the google-genai client used for the Batch API"""
+        if self._batch_client is None:
+            # Imported here so the live pipeline doesn't pay for (or require) google-genai
+            from google.genai import Client
+            self._batch_client = Client(api_key=self._api_key)
+        return self._batch_client
+
+    def submit_batch(self, tickets):
+        """
+        Submit tickets to the Gemini Batch API.
+        
+        Each JSONL request is keyed by the ticket's position so results can be
+        mapped back regardless of the order the service returns them in.
+        
+        Args:
+            tickets (list): List of ticket dictionaries
+            
+        Returns:
+            str: Batch job name, to pass to wait_for_batch
+        """
+        generation_config = {
+            'response_mime_type': 'application/json',
+            'response_json_schema': Classification.model_json_schema()
+        }
+        lines = [
+            orjson.dumps({
+                'key': str(i),
+                'request': {
+                    'contents': [{'role': 'user', 'parts': [{'text': self._build_prompt(ticket)}]}],
+                    'generation_config': generation_config
+                }
+            })
+            for i, ticket in enumerate(tickets)
+        ]
+        
+        client = self._get_batch_client()
+        uploaded = client.files.upload(
+            file=io.BytesIO(b'\n'.join(lines)),
+            config={'display_name': 'ticket-classification', 'mime_type': 'jsonl'}
+        )
+        job = client.batches.create(
+            model=BATCH_API_MODEL,
+            src=uploaded.name,
+            config={'display_name': 'ticket-classification'}
+        )
+        
+        logger.info("Submitted batch %s with %d tickets", job.name, len(tickets))
+        return job.name
+
+    def wait_for_batch(self, batch_name, tickets, max_wait=None):
+        """
+        Poll a Batch API job with exponential backoff and collect its results.
+        
+        Args:
+            batch_name (str): Name returned by submit_batch
+            tickets (list): The same tickets, in the same order, as submitted
+            max_wait (float): Give up after this many seconds (None waits indefinitely)
+            
+        Returns:
+            list: List of classification results, in input order
+        """
+        client = self._get_batch_client()
+        started = time.monotonic()
+        attempt = 0
+        
+        while True:
+            job = client.batches.get(name=batch_name)
+            state = job.state.name if job.state else 'JOB_STATE_UNSPECIFIED'
+            if state in BATCH_TERMINAL_STATES:
+                break
+            if max_wait is not None and time.monotonic() - started >= max_wait:
+                return [self._api_error(t, f"Batch {batch_name} still {state} after {max_wait}s") for t in tickets]
+            
+            time.sleep(min(BATCH_POLL_CAP, BATCH_POLL_BASE * 2 ** attempt))
+            attempt += 1
+        
+        if state not in BATCH_RESULT_STATES:
+            return [self._api_error(t, f"Batch {batch_name} ended in {state}: {job.error}") for t in tickets]
+        
+        results = [None] * len(tickets)
+        data = client.files.download(file=job.dest.file_name)
+        
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            try:
+                entry = orjson.loads(line)
+                i = int(entry['key'])
+                ticket = tickets[i]
+                if 'response' not in entry:
+                    results[i] = self._api_error(ticket, entry.get('error'))
+                    continue
+                parts = entry['response']['candidates'][0]['content']['parts']
+                results[i] = self._parse_response(ticket, ''.join(p.get('text', '') for p in parts))
+                self._cache_store(ticket, results[i])
+            except Exception as e:
+                logger.warning("Skipping unreadable batch result line: %s", e)
+        
+        self.save_caches()
+        return [
+            result if result is not None else self._api_error(ticket, "No result returned by batch job")
+            for ticket, result in zip(tickets, results)
+        ]
+
+    def classify_offline(self, tickets):
+        """
+        Classify a large, non-interactive backlog via the Gemini Batch API.
+        
+        Falls back to the live concurrent pipeline for fewer than
+        BATCH_API_MIN_TICKETS tickets, where the batch turnaround isn't worth it.
+        
+        Args:
+            tickets (list): List of ticket dictionaries
+            
+        Returns:
+            list: List of classification results, in input order
+        """
+        tickets = list(tickets)
+        if len(tickets) < BATCH_API_MIN_TICKETS:
+            return self.process_batch(tickets)
+        
+        return self.wait_for_batch(self.submit_batch(tickets), tickets)
+
+
+def configure_logging(level=logging.INFO):
+    """
+    Send log output to stderr from a background thread.
+    
+    Records are only enqueued by the caller (QueueHandler), so the event loop never
+    blocks on the per-record write + flush; a QueueListener thread drains the queue
+    into a StreamHandler and is stopped (flushing what's left) at interpreter exit.
+    """
+    records = SimpleQueue()
+    listener = QueueListener(records, logging.StreamHandler())
+    listener.start()
+    atexit.register(listener.stop)
+    
+    logging.basicConfig(level=level, format='%(message)s', handlers=[QueueHandler(records)])
+
 
 def print_result(result):
     """Pretty print a classification result"""
@@ -193,12 +948,13 @@ def print_result(result):
 
 # Test the classifier when run directly
 if __name__ == "__main__":
+    configure_logging()
     print("\n🤖 CS AGENT WORKFLOW ENGINE - Test Mode (Gemini)\n")
     
     # Load sample tickets
     try:
-        with open('sample_tickets.json', 'r') as f:
-            tickets = json.load(f)
+        with open('sample_tickets.json', 'rb') as f:
+            tickets = orjson.loads(f.read())
         print(f"✓ Loaded {len(tickets)} sample tickets\n")
     except FileNotFoundError:
         print("❌ Error: sample_tickets.json not found")
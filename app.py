@@ -1,62 +1,232 @@
-from flask import Flask, render_template, request, jsonify
-import json
-from agent_classifier import AgentClassifier
+from quart import Quart, render_template, request, jsonify, make_response, stream_with_context
+from quart.json.provider import JSONProvider
+import time
+import asyncio
+from uuid import uuid4
+import ijson
+import orjson
+from agent_classifier import AgentClassifier, configure_logging
 
-app = Flask(__name__)
 
-# Initialize classifier once at startup
+class ORJSONProvider(JSONProvider):
+    """Quart JSON provider backed by orjson for request parsing and jsonify"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype='application/json')
+
+
+class BatchJob:
+    """In-memory state of a background /process-batch run"""
+    
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.done = 0
+        self.total = None
+        self.results = None
+        self.error = None
+        self.finished_at = None
+        self.task = None
+        # Replaced on every change so each subscriber can await the next update
+        self.changed = asyncio.Event()
+    
+    @property
+    def status(self):
+        if self.finished_at is None:
+            return 'running'
+        return 'failed' if self.error else 'completed'
+    
+    def _touch(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+    
+    def on_progress(self, done, result):
+        self.done = done
+        self._touch()
+    
+    def on_total(self, total):
+        self.total = total
+        self._touch()
+    
+    def finish(self, results=None, error=None):
+        self.results = results
+        self.error = error
+        self.total = len(results) if results is not None else self.done
+        self.finished_at = time.monotonic()
+        self._touch()
+    
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'done': self.done,
+            'total': self.total,
+            'results': self.results,
+            'error': self.error
+        }
+
+
+# Seconds a finished job's results are kept before being dropped
+JOB_TTL = 600
+
+jobs = {}
+
+
+def _prune_jobs():
+    """Drop finished jobs older than JOB_TTL"""
+    cutoff = time.monotonic() - JOB_TTL
+    for job_id in [j for j, job in jobs.items() if job.finished_at and job.finished_at < cutoff]:
+        del jobs[job_id]
+
+
+def _sse(event, data):
+    """Format one Server-Sent Event"""
+    return b'event: ' + event.encode() + b'\ndata: ' + orjson.dumps(data) + b'\n\n'
+
+
+app = Quart(__name__)
+app.json = ORJSONProvider(app)
+
+# One shared classifier per worker process (AgentClassifier.get() is a process-wide singleton)
 try:
-    classifier = AgentClassifier()
+    classifier = AgentClassifier.get()
     print("✓ Agent classifier initialized")
 except Exception as e:
     print(f"✗ Failed to initialize classifier: {e}")
     classifier = None
 
 
+@app.after_serving
+async def persist_caches():
+    """Save caches filled by single /classify calls when the server stops"""
+    if classifier:
+        classifier.save_caches()
+
+
 @app.route('/')
-def index():
+async def index():
     """Main page"""
-    return render_template('index.html')
+    return await render_template('index.html')
 
 
 @app.route('/classify', methods=['POST'])
-def classify():
-    """API endpoint to classify a single ticket"""
+async def classify():
+    """
+    API endpoint to classify a single ticket.
+    
+    With ?stream=1 the response is newline-delimited JSON: partial
+    classification snapshots as Gemini streams, then the final result.
+    """
     if not classifier:
         return jsonify({
             'success': False,
             'error': 'Classifier not initialized'
         }), 500
     
-    ticket_data = request.json
-    result = classifier.classify_ticket(ticket_data)
+    ticket_data = await request.get_json()
+    
+    if request.args.get('stream') == '1':
+        @stream_with_context
+        async def generate():
+            async for event in classifier.stream_classify_ticket_async(ticket_data):
+                yield orjson.dumps(event) + b'\n'
+        
+        return generate(), 200, {'Content-Type': 'application/x-ndjson'}
+    
+    result = await classifier.classify_ticket_async(ticket_data)
     return jsonify(result)
 
 
+async def _run_batch(job):
+    """Classify all sample tickets for a background job"""
+    try:
+        # Stream tickets from the file instead of loading the whole array up front
+        with open('sample_tickets.json', 'rb') as f:
+            results = await classifier.process_batch_async(
+                ijson.items(f, 'item', use_float=True),
+                on_progress=job.on_progress,
+                on_total=job.on_total
+            )
+        job.finish(results=results)
+    except Exception as e:
+        job.finish(error=str(e))
+
+
 @app.route('/process-batch', methods=['POST'])
-def process_batch():
-    """Process all sample tickets"""
+async def process_batch():
+    """
+    Start processing all sample tickets in the background.
+    
+    Returns 202 with a job id; follow progress on /jobs/<job_id>/events
+    and fetch results from /jobs/<job_id>.
+    """
     if not classifier:
         return jsonify({
             'success': False,
             'error': 'Classifier not initialized'
         }), 500
     
-    try:
-        with open('sample_tickets.json', 'r') as f:
-            tickets = json.load(f)
-        
-        results = classifier.process_batch(tickets)
-        return jsonify(results)
-    except Exception as e:
+    _prune_jobs()
+    
+    job = BatchJob(uuid4().hex)
+    job.task = asyncio.create_task(_run_batch(job))
+    jobs[job.job_id] = job
+    
+    return jsonify({'job_id': job.job_id}), 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+async def job_status(job_id):
+    """Status and (once finished) results of a batch job"""
+    job = jobs.get(job_id)
+    if not job:
         return jsonify({
             'success': False,
-            'error': str(e)
-        }), 500
+            'error': 'Unknown job'
+        }), 404
+    
+    return jsonify(job.to_dict())
+
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+async def job_events(job_id):
+    """Server-Sent Events stream of a batch job's progress"""
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'error': 'Unknown job'
+        }), 404
+    
+    async def generate():
+        last = None
+        while True:
+            changed = job.changed
+            if job.done != last:
+                last = job.done
+                yield _sse('progress', {'done': job.done, 'total': job.total})
+            if job.finished_at is not None:
+                yield _sse(job.status, {'done': job.done, 'total': job.total, 'error': job.error})
+                return
+            await changed.wait()
+    
+    response = await make_response(generate(), 200, {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache'
+    })
+    # Batches can outlast Quart's default response timeout
+    response.timeout = None
+    return response
 
 
 @app.route('/health', methods=['GET'])
-def health():
+async def health():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
@@ -65,11 +235,13 @@ def health():
 
 
 if __name__ == '__main__':
+    configure_logging()
     print("\n" + "="*80)
     print("🤖 CS AGENT WORKFLOW ENGINE - Web Interface")
     print("="*80)
-    print("\n✓ Starting Flask server...")
+    print("\n✓ Starting Quart server...")
     print("✓ Open your browser to: http://localhost:5000")
     print("\nPress CTRL+C to stop the server\n")
     
-    app.run(debug=True, port=5000, host='127.0.0.1')
\ No newline at end of file
+    # The reloader re-imports this module in a child process, initializing everything twice
+    app.run(debug=True, use_reloader=False, port=5000, host='127.0.0.1')
\ No newline at end of file
@@ -0,0 +1,194 @@
+import os
+import time
+import asyncio
+from collections import deque
+
+# Published per-provider limits used to seed the limiter defaults
+PROVIDER_PROFILES = {
+    'google-ai': {
+        'rpm': 60,
+        'tpm': 100_000,
+        'max_concurrency': 8,
+        'aimd_alpha': 1,       # additive increase per healthy window
+        'aimd_beta': 0.5,      # multiplicative decrease on throttle
+    },
+}
+
+
+class RateLimiter:
+    """
+    Sliding-window limiter enforcing both requests-per-minute and
+    tokens-per-minute before each Gemini call.
+
+    Shared across all concurrent classify calls so the batch as a whole
+    stays under the provider ceiling instead of tripping 429s.
+    """
+
+    def __init__(self, rpm, tpm, window=60.0):
+        """
+        Args:
+            rpm (int): Max requests per window
+            tpm (int): Max tokens (prompt + output budget) per window
+            window (float): Window length in seconds
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window = window
+        self._requests = deque()   # timestamps of admitted requests
+        self._tokens = deque()     # (timestamp, tokens) of admitted requests
+        self._token_sum = 0
+
+    @classmethod
+    def from_env(cls, provider='google-ai'):
+        """Build a limiter from the provider profile, overridable via GEMINI_RPM / GEMINI_TPM"""
+        profile = PROVIDER_PROFILES[provider]
+        rpm = int(os.getenv('GEMINI_RPM', profile['rpm']))
+        tpm = int(os.getenv('GEMINI_TPM', profile['tpm']))
+        return cls(rpm=rpm, tpm=tpm)
+
+    def _evict(self, now):
+        """Drop entries that have aged out of the window"""
+        cutoff = now - self.window
+        while self._requests and self._requests[0] <= cutoff:
+            self._requests.popleft()
+        while self._tokens and self._tokens[0][0] <= cutoff:
+            self._token_sum -= self._tokens.popleft()[1]
+
+    def _wait_time(self, now, tokens):
+        """Seconds until a request of `tokens` fits in both windows (0 if it fits now)"""
+        wait = 0.0
+
+        if len(self._requests) >= self.rpm:
+            wait = self._requests[0] + self.window - now
+
+        excess = self._token_sum + tokens - self.tpm
+        if excess > 0:
+            # Wait until enough of the oldest token entries expire
+            freed = 0
+            for ts, used in self._tokens:
+                freed += used
+                if freed >= excess:
+                    wait = max(wait, ts + self.window - now)
+                    break
+
+        return wait
+
+    async def acquire(self, tokens=0):
+        """
+        Wait until one request of `tokens` can be admitted, then record it.
+
+        Args:
+            tokens (int): Estimated tokens the request will consume
+        """
+        # A single request larger than the whole budget must still be admitted eventually
+        tokens = min(tokens, self.tpm)
+
+        while True:
+            now = time.monotonic()
+            self._evict(now)
+            wait = self._wait_time(now, tokens)
+
+            if wait <= 0:
+                self._requests.append(now)
+                self._tokens.append((now, tokens))
+                self._token_sum += tokens
+                return
+
+            await asyncio.sleep(wait)
+
+
+class DynamicSemaphore:
+    """
+    Concurrency limit with AIMD (additive increase, multiplicative decrease)
+    control.
+
+    The limit is halved once per congestion event when the provider throttles
+    us (429/503) and grows by one slot after each window of sustained success,
+    so in-flight requests settle just under the provider's real ceiling.
+    """
+
+    def __init__(self, max_limit, alpha=1, beta=0.5, increase_interval=5.0):
+        """
+        Args:
+            max_limit (int): Upper bound (and starting value) for the limit
+            alpha (int): Slots added after a successful window
+            beta (float): Factor applied to the limit on throttle
+            increase_interval (float): Seconds of success required per increase
+        """
+        self.max_limit = max_limit
+        self.current_limit = max_limit
+        self.alpha = alpha
+        self.beta = beta
+        self.increase_interval = increase_interval
+        self._in_flight = 0
+        self._waiters = deque()
+        self._window_start = time.monotonic()
+        self._last_decrease = None
+
+    @classmethod
+    def from_profile(cls, provider='google-ai'):
+        """Build a controller seeded from the provider profile"""
+        profile = PROVIDER_PROFILES[provider]
+        return cls(
+            max_limit=profile['max_concurrency'],
+            alpha=profile['aimd_alpha'],
+            beta=profile['aimd_beta'],
+        )
+
+    def _wake(self):
+        """Wake as many waiters as there are free slots"""
+        free = self.current_limit - self._in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    async def acquire(self):
+        """Wait for a free slot under the current limit"""
+        while self._in_flight >= self.current_limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self._in_flight += 1
+
+    def release(self):
+        """Return a slot and wake the next waiter"""
+        self._in_flight -= 1
+        self._wake()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    def on_throttle(self):
+        """
+        Multiplicative decrease after a 429/503 from the provider.
+
+        A burst of throttles across in-flight requests (and their retries) is one
+        congestion event, so throttles within `increase_interval` of the last
+        decrease only postpone the next increase instead of halving again.
+        """
+        now = time.monotonic()
+        self._window_start = now
+
+        if self._last_decrease is not None and now - self._last_decrease < self.increase_interval:
+            return
+
+        self.current_limit = max(1, int(self.current_limit * self.beta))
+        self._last_decrease = now
+
+    def on_success(self):
+        """Additive increase once a full window has passed without throttling"""
+        now = time.monotonic()
+        if now - self._window_start >= self.increase_interval:
+            self.current_limit = min(self.max_limit, self.current_limit + self.alpha)
+            self._window_start = now
+            self._wake()
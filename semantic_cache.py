@@ -0,0 +1,110 @@
+import os
+import numpy as np
+import orjson
+
+# Gemini embedding model and its output dimensionality
+EMBEDDING_MODEL = 'models/text-embedding-004'
+EMBEDDING_DIM = 768
+
+# Initial row capacity of the embedding matrix (doubled whenever it fills up)
+INITIAL_CAPACITY = 64
+
+# Cosine similarity above which two tickets are treated as the same issue
+DEFAULT_THRESHOLD = 0.92
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache of classifications keyed by ticket embeddings.
+
+    Catches paraphrased duplicates ("can't log in" vs "login broken") that an
+    exact-match cache misses. Entries are scoped (by customer tier) so a Pro
+    ticket never reuses an Enterprise classification and vice versa.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, path=None):
+        """
+        Args:
+            threshold (float): Minimum cosine similarity for a hit
+            path (str): File prefix for persistence (<path>.npy / <path>.json), or None
+        """
+        self.threshold = threshold
+        self.path = path
+        self._embs = np.empty((INITIAL_CAPACITY, EMBEDDING_DIM), dtype=np.float32)
+        self._scopes = []
+        self._payloads = []
+        self._dirty = False
+
+        if path and os.path.exists(path + '.npy') and os.path.exists(path + '.json'):
+            self._load()
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache from SEMANTIC_CACHE_THRESHOLD / SEMANTIC_CACHE_PATH"""
+        threshold = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', DEFAULT_THRESHOLD))
+        path = os.getenv('SEMANTIC_CACHE_PATH', 'semantic_cache')
+        return cls(threshold=threshold, path=path)
+
+    def __len__(self):
+        return len(self._payloads)
+
+    @staticmethod
+    def _normalize(embedding):
+        """Unit-normalize so cosine similarity is a plain dot product"""
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def lookup(self, embedding, scope):
+        """
+        Find the most similar cached entry within a scope.
+
+        Args:
+            embedding (list): Query embedding
+            scope (str): Partition the entry must belong to (e.g. customer tier)
+
+        Returns:
+            dict: Cached classification, or None if nothing clears the threshold
+        """
+        if not self._payloads:
+            return None
+
+        sims = self._embs[:len(self)] @ self._normalize(embedding)
+        sims[np.asarray(self._scopes) != scope] = -1.0
+        i = int(np.argmax(sims))
+
+        if sims[i] >= self.threshold:
+            return dict(self._payloads[i])
+        return None
+
+    def add(self, embedding, scope, classification):
+        """Store a classification in memory (call save() to persist)"""
+        size = len(self)
+        if size == len(self._embs):
+            # Amortized growth: double the matrix instead of copying it on every insert
+            grown = np.empty((max(INITIAL_CAPACITY, 2 * size), EMBEDDING_DIM), dtype=np.float32)
+            grown[:size] = self._embs[:size]
+            self._embs = grown
+
+        self._embs[size] = self._normalize(embedding)
+        self._scopes.append(scope)
+        self._payloads.append(dict(classification))
+        self._dirty = True
+
+    def save(self):
+        """Write embeddings and payloads to <path>.npy / <path>.json if anything changed"""
+        if not self.path or not self._dirty:
+            return
+
+        np.save(self.path + '.npy', self._embs[:len(self)])
+        with open(self.path + '.json', 'wb') as f:
+            f.write(orjson.dumps({'scopes': self._scopes, 'payloads': self._payloads}))
+        self._dirty = False
+
+    def _load(self):
+        """Read a previously saved cache"""
+        self._embs = np.load(self.path + '.npy')
+        with open(self.path + '.json', 'rb') as f:
+            data = orjson.loads(f.read())
+        self._scopes = data['scopes']
+        self._payloads = data['payloads']
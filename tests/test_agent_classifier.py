@@ -0,0 +1,114 @@
+import json
+import asyncio
+from pathlib import Path
+
+import pytest
+from google.generativeai.types import generation_types
+
+import agent_classifier
+from agent_classifier import AgentClassifier
+
+SAMPLE_TICKETS = Path(__file__).resolve().parent.parent / 'sample_tickets.json'
+
+CLASSIFICATION = {
+    "category": "TECHNICAL",
+    "priority": "HIGH",
+    "should_escalate": True,
+    "escalate_to": "ENGINEERING",
+    "reasoning": "Export failing for days",
+    "suggested_tags": ["export", "bug"],
+    "confidence": 0.9
+}
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class SchemaCheckingModel:
+    """Stand-in for GenerativeModel that normalizes generation_config the way the SDK does"""
+    
+    def __init__(self):
+        self.batch_calls = 0
+        self.single_calls = 0
+        self.count_calls = 0
+    
+    async def generate_content_async(self, prompt, generation_config=None, **kwargs):
+        generation_types.to_generation_config_dict(generation_config)
+        
+        count = prompt.count('[TICKET ')
+        if count:
+            self.batch_calls += 1
+            return FakeResponse(json.dumps([CLASSIFICATION] * count))
+        
+        self.single_calls += 1
+        return FakeResponse(json.dumps(CLASSIFICATION))
+    
+    async def count_tokens_async(self, prompt):
+        self.count_calls += 1
+        await asyncio.sleep(0)
+        raise RuntimeError("offline")
+
+
+@pytest.fixture
+def classifier(monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEY', 'test-key')
+    monkeypatch.delenv('CLASSIFIER_CACHE', raising=False)
+    monkeypatch.delenv('SEMANTIC_CACHE', raising=False)
+    
+    instance = AgentClassifier()
+    instance.model = SchemaCheckingModel()
+    return instance
+
+
+@pytest.fixture
+def tickets():
+    with open(SAMPLE_TICKETS, 'r') as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize('config', [
+    agent_classifier.CLASSIFICATION_CONFIG,
+    agent_classifier.BATCH_CLASSIFICATION_CONFIG,
+])
+def test_generation_configs_normalize(config):
+    generation_types.to_generation_config_dict(config)
+
+
+def test_batched_path_uses_one_call_per_chunk(classifier, tickets):
+    results = asyncio.run(classifier.classify_tickets_batched_async(tickets))
+    
+    assert classifier.model.batch_calls == 1
+    assert classifier.model.single_calls == 0
+    assert [r['ticket_id'] for r in results] == [t['id'] for t in tickets]
+    assert all(r['success'] for r in results)
+
+
+def test_streamed_batch_reports_total_once_exhausted(classifier, tickets):
+    totals = []
+    
+    async def stream():
+        for ticket in tickets:
+            yield ticket
+    
+    results = asyncio.run(classifier.process_batch_async(stream(), on_total=totals.append))
+    
+    assert totals == [len(tickets)]
+    assert [r['ticket_id'] for r in results] == [t['id'] for t in tickets]
+
+
+def test_batch_survives_malformed_tickets(classifier, tickets):
+    items = [None, {'subject': 'no id'}, 'not a ticket'] * 10 + tickets
+    
+    results = asyncio.run(asyncio.wait_for(classifier.process_batch_async(iter(items)), 5))
+    
+    assert len(results) == len(items)
+    assert not any(r['success'] for r in results[:30])
+    assert all(r['success'] for r in results[30:])
+
+
+def test_system_prompt_counted_once(classifier, tickets):
+    asyncio.run(classifier.process_batch_async(tickets))
+    
+    assert classifier.model.count_calls == 1
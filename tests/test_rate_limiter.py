@@ -0,0 +1,22 @@
+import time
+
+from rate_limiter import DynamicSemaphore
+
+
+def test_throttle_burst_decreases_once():
+    sem = DynamicSemaphore(max_limit=8, increase_interval=5.0)
+    
+    for _ in range(8):
+        sem.on_throttle()
+    
+    assert sem.current_limit == 4
+
+
+def test_throttle_after_interval_decreases_again():
+    sem = DynamicSemaphore(max_limit=8, increase_interval=0.01)
+    
+    sem.on_throttle()
+    time.sleep(0.02)
+    sem.on_throttle()
+    
+    assert sem.current_limit == 2
@@ -0,0 +1,34 @@
+import numpy as np
+
+from semantic_cache import SemanticCache, EMBEDDING_DIM, INITIAL_CAPACITY
+
+
+def _vec(seed):
+    return np.random.default_rng(seed).standard_normal(EMBEDDING_DIM)
+
+
+def test_lookup_grows_past_initial_capacity():
+    cache = SemanticCache()
+    
+    for i in range(INITIAL_CAPACITY + 5):
+        cache.add(_vec(i), 'Pro', {'n': i})
+    
+    assert len(cache) == INITIAL_CAPACITY + 5
+    assert cache.lookup(_vec(INITIAL_CAPACITY + 2), 'Pro') == {'n': INITIAL_CAPACITY + 2}
+    assert cache.lookup(_vec(0), 'Enterprise') is None
+
+
+def test_add_persists_only_on_save(tmp_path):
+    path = str(tmp_path / 'cache')
+    cache = SemanticCache(path=path)
+    cache.add(_vec(1), 'Pro', {'n': 1})
+    
+    assert not (tmp_path / 'cache.npy').exists()
+    
+    cache.save()
+    reloaded = SemanticCache(path=path)
+    
+    assert len(reloaded) == 1
+    assert reloaded.lookup(_vec(1), 'Pro') == {'n': 1}
+    reloaded.add(_vec(2), 'Pro', {'n': 2})
+    assert reloaded.lookup(_vec(2), 'Pro') == {'n': 2}